@@ -5,11 +5,63 @@ Authentication manager for user login/signup
 
 import streamlit as st
 import re
+import string
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Optional, Dict, Any
 from database_manager import get_database_manager
 import hashlib
 from datetime import datetime
 
+# Email pattern, compiled once at import
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Character classes for password checks; isdisjoint scans the string in C
+_UPPER_CHARS = frozenset(string.ascii_uppercase)
+_LOWER_CHARS = frozenset(string.ascii_lowercase)
+_DIGIT_CHARS = frozenset(string.digits)
+
+# Background workers for sidebar stats queries
+_STATS_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="user-stats")
+
+# Password hashing runs here so concurrent logins can't stack up bcrypt work in
+# script threads; the wait is bounded so a backlog shows an error, not a hang
+_KDF_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="password-kdf")
+_KDF_TIMEOUT = 30
+
+_AUTH_CSS = """
+<style>
+.auth-container {
+    max-width: 400px;
+    margin: auto;
+    padding: 2rem;
+    background-color: #f0f2f6;
+    border-radius: 10px;
+    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+}
+</style>
+"""
+
+
+def run_password_kdf(message: str, fn, *args):
+    """
+    Run a password-hashing database call on the KDF pool
+    
+    Args:
+        message: Spinner text shown while waiting
+        fn: authenticate_user or create_user
+        *args: Arguments for fn
+    
+    Returns:
+        The call's result, or False if it didn't finish in time
+    """
+    future = _KDF_POOL.submit(fn, *args)
+    with st.spinner(message):
+        try:
+            return future.result(timeout=_KDF_TIMEOUT)
+        except FutureTimeoutError:
+            return False
+
 
 class AuthManager:
     """Manages user authentication and session state"""
@@ -27,37 +79,34 @@ class AuthManager:
         if 'auth_mode' not in st.session_state:
             st.session_state.auth_mode = 'login'
     
-    def validate_email(self, email: str) -> bool:
-        """Validate email format"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def validate_email(email: str) -> bool:
+        """Validate email format (memoized, as forms re-validate on every rerun)"""
+        return _EMAIL_RE.match(email) is not None
     
     def validate_password(self, password: str) -> tuple[bool, str]:
         """Validate password strength"""
         if len(password) < 8:
             return False, "Password must be at least 8 characters long"
-        if not re.search(r'[A-Z]', password):
+        
+        has_upper = not _UPPER_CHARS.isdisjoint(password)
+        has_lower = not _LOWER_CHARS.isdisjoint(password)
+        # Fall back to a Unicode check only when there is no ASCII digit
+        has_digit = not _DIGIT_CHARS.isdisjoint(password) or any(c.isdecimal() for c in password)
+        
+        if not has_upper:
             return False, "Password must contain at least one uppercase letter"
-        if not re.search(r'[a-z]', password):
+        if not has_lower:
             return False, "Password must contain at least one lowercase letter"
-        if not re.search(r'\d', password):
+        if not has_digit:
             return False, "Password must contain at least one number"
         return True, "Password is valid"
     
     def render_auth_page(self):
         """Render the authentication page"""
-        st.markdown("""
-        <style>
-        .auth-container {
-            max-width: 400px;
-            margin: auto;
-            padding: 2rem;
-            background-color: #f0f2f6;
-            border-radius: 10px;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        }
-        </style>
-        """, unsafe_allow_html=True)
+        # Re-emitted each run: Streamlit drops elements a rerun doesn't draw
+        st.markdown(_AUTH_CSS, unsafe_allow_html=True)
         
         # Title and description
         st.title("Space Mission Design Assistant")
@@ -122,10 +171,14 @@ class AuthManager:
                 if not username_or_email or not password:
                     st.error("Please fill in all fields")
                 else:
-                    user = self.db_manager.authenticate_user(username_or_email, password)
-                    if user:
+                    user = run_password_kdf("Signing in...", self.db_manager.authenticate_user,
+                                            username_or_email, password)
+                    if user is False:
+                        st.error("Login is taking longer than usual. Please try again.")
+                    elif user:
                         st.session_state.authenticated = True
                         st.session_state.user = user
+                        self._prefetch_user_stats(user['id'])
                         st.success(f"Welcome back, {user['username']}!")
                         st.balloons()
                         st.rerun()
@@ -166,44 +219,63 @@ class AuthManager:
             submit = st.form_submit_button("Create Account", use_container_width=True, type="primary")
             
             if submit:
-                # Validation
-                errors = []
+                # Validation, cheapest checks first; stop at the first failure
+                error = None
                 
                 if not all([username, email, password, confirm_password]):
-                    errors.append("Please fill in all fields")
-                
-                if username and len(username) < 3:
-                    errors.append("Username must be at least 3 characters")
-                
-                if email and not self.validate_email(email):
-                    errors.append("Please enter a valid email address")
-                
-                if password:
+                    error = "Please fill in all fields"
+                elif not terms:
+                    error = "You must agree to the Terms of Service"
+                elif len(username) < 3:
+                    error = "Username must be at least 3 characters"
+                elif len(password) < 8:
+                    error = "Password must be at least 8 characters long"
+                elif password != confirm_password:
+                    error = "Passwords do not match"
+                else:
                     valid, msg = self.validate_password(password)
                     if not valid:
-                        errors.append(msg)
-                
-                if password != confirm_password:
-                    errors.append("Passwords do not match")
-                
-                if not terms:
-                    errors.append("You must agree to the Terms of Service")
+                        error = msg
+                    elif not self.validate_email(email):
+                        error = "Please enter a valid email address"
                 
-                if errors:
-                    for error in errors:
-                        st.error(error)
+                if error:
+                    st.error(error)
                 else:
                     # Create user
-                    user = self.db_manager.create_user(username, email, password)
-                    if user:
+                    user = run_password_kdf("Creating account...", self.db_manager.create_user,
+                                            username, email, password)
+                    if user is False:
+                        st.error("Sign-up is taking longer than usual. Please try again.")
+                    elif user:
                         st.session_state.authenticated = True
                         st.session_state.user = user
+                        self._prefetch_user_stats(user['id'])
                         st.success(f"Welcome, {user['username']}! Your account has been created.")
                         st.balloons()
                         st.rerun()
                     else:
                         st.error("Username or email already exists. Please try different ones.")
     
+    def _prefetch_user_stats(self, user_id: int):
+        """Start loading the user's stats in the background"""
+        version = self.db_manager.get_stats_version(user_id)
+        future = _STATS_POOL.submit(self.db_manager.get_user_stats, user_id)
+        st.session_state.user_stats = (version, future)
+    
+    def _get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """Get prefetched stats without blocking, refetching after new messages"""
+        version, future = st.session_state.get('user_stats', (None, None))
+        stale = version != self.db_manager.get_stats_version(user_id)
+        failed = future is not None and future.done() and future.exception() is not None
+        if future is None or stale or failed:
+            self._prefetch_user_stats(user_id)
+            version, future = st.session_state.user_stats
+        
+        if future.done() and future.exception() is None:
+            return future.result()
+        return {'total_messages': '…', 'unique_sessions': '…'}
+    
     def render_user_menu(self):
         """Render user menu in sidebar"""
         if st.session_state.authenticated:
@@ -212,7 +284,7 @@ class AuthManager:
             
             if st.session_state.user['id']:  # Not guest
                 # Show user stats
-                stats = self.db_manager.get_user_stats(st.session_state.user['id'])
+                stats = self._get_user_stats(st.session_state.user['id'])
                 st.sidebar.text(f"Total messages: {stats['total_messages']}")
                 st.sidebar.text(f"Chat sessions: {stats['unique_sessions']}")
             
@@ -223,6 +295,7 @@ class AuthManager:
         """Logout user"""
         st.session_state.authenticated = False
         st.session_state.user = None
+        st.session_state.pop('user_stats', None)
         st.session_state.messages = []
         st.session_state.initialized = False
         st.rerun()
@@ -239,4 +312,16 @@ class AuthManager:
         """Get current user ID (None for guests)"""
         if self.is_registered_user():
             return st.session_state.user['id']
-        return None
\ No newline at end of file
+        return None
+
+@st.cache_resource
+def _get_shared_auth_manager() -> AuthManager:
+    """Create the auth manager once per process"""
+    return AuthManager()
+
+
+def get_auth_manager() -> AuthManager:
+    """Get the shared auth manager, initializing this session's auth state"""
+    manager = _get_shared_auth_manager()
+    manager._init_session_state()
+    return manager
@@ -4,20 +4,72 @@ Database manager for user authentication and chat history
 """
 
 import os
-import json
-from datetime import datetime
-from typing import List, Dict, Optional, Any
+import time
+import logging
+import atexit
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any, Tuple
 import hashlib
 import secrets
-from sqlalchemy import create_engine, Column, String, Text, DateTime, Integer, Boolean
+from sqlalchemy import create_engine, event, text, bindparam, Column, String, Text, DateTime, Integer, Boolean, Index, LargeBinary, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker, scoped_session, Session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.exc import IntegrityError, DataError
 import bcrypt
 import streamlit as st
 
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
+# Hashing time a login may spend in bcrypt when the cost is sized to the host
+BCRYPT_TARGET_SECONDS = 0.25
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 14
+
+
+def _calibrate_bcrypt_rounds() -> int:
+    """Pick the highest bcrypt cost that hashes within the target time on this host"""
+    # Time the minimum cost once; each extra round doubles the work
+    started = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=BCRYPT_MIN_ROUNDS))
+    elapsed = time.perf_counter() - started
+    
+    rounds = BCRYPT_MIN_ROUNDS
+    while rounds < BCRYPT_MAX_ROUNDS and elapsed * 2 <= BCRYPT_TARGET_SECONDS:
+        elapsed *= 2
+        rounds += 1
+    return rounds
+
+
+# bcrypt cost factor; each step doubles hashing time. Set BCRYPT_ROUNDS to pin it
+# rather than calibrating on each start
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS") or _calibrate_bcrypt_rounds())
+
+
+def _hash_password(password: bytes) -> bytes:
+    """Hash a UTF-8 encoded password with the configured bcrypt cost"""
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+
+
+def _needs_rehash(password_hash: bytes) -> bool:
+    """Check whether a stored hash was made with a lower cost factor than the current one"""
+    # bcrypt hashes look like $2b$<rounds>$<salt+digest>. Only upgrade: the calibrated
+    # cost can differ between restarts, and stronger hashes are never weakened
+    try:
+        return int(password_hash.split(b'$')[2]) < BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
+# Native JSON column: JSONB on Postgres, JSON text on SQLite
+_SourcesJSON = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')
+
+
 class User(Base):
     """User model for authentication"""
     __tablename__ = 'users'
@@ -25,7 +77,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     username = Column(String(50), unique=True, nullable=False, index=True)
     email = Column(String(100), unique=True, nullable=False, index=True)
-    password_hash = Column(String(255), nullable=False)
+    password_hash = Column(LargeBinary(60), nullable=False)  # Raw bcrypt output
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login = Column(DateTime)
     is_active = Column(Boolean, default=True)
@@ -33,15 +85,119 @@ class User(Base):
 class ChatHistory(Base):
     """Chat history model"""
     __tablename__ = 'chat_history'
+    __table_args__ = (
+        # History queries filter on user/session and order by time
+        Index('ix_ch_user_created', 'user_id', 'created_at'),
+        Index('ix_ch_session_created', 'session_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, nullable=True)  # Nullable for guest users
-    session_id = Column(String(100), nullable=False, index=True)
+    session_id = Column(String(100), nullable=False)
     message_type = Column(String(20), nullable=False)  # 'user' or 'assistant'
     message = Column(Text, nullable=False)
-    sources = Column(Text, nullable=True)  # JSON string of sources
+    sources = Column(_SourcesJSON, nullable=True)  # List of source dicts
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class QueryCache(Base):
+    """Answered queries, kept so the response cache survives restarts"""
+    __tablename__ = 'query_cache'
+    
+    cache_key = Column(String(128), primary_key=True)
+    result = Column(_SourcesJSON, nullable=False)  # Query result dict
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# Raw SQL statements, built once so SQLAlchemy's compiled cache is reused
+_LOGIN_SQL = text("""
+    SELECT id, username, email, password_hash, is_active
+    FROM users WHERE username = :login
+    UNION ALL
+    SELECT id, username, email, password_hash, is_active
+    FROM users WHERE email = :login
+    LIMIT 1
+""").columns(password_hash=LargeBinary)
+
+# History reads return sources as raw JSON text so callers parse only what they show
+# Newest page first, returned in chronological order
+_USER_HISTORY_SQL = text("""
+    SELECT * FROM (
+        SELECT id, session_id, message_type, message, CAST(sources AS TEXT) AS sources_json, created_at
+        FROM chat_history
+        WHERE user_id = :user_id
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit
+    ) AS page
+    ORDER BY created_at, id
+""").columns(created_at=DateTime)
+
+# Keyset page: rows strictly older than the (before, before_id) cursor
+_USER_HISTORY_BEFORE_SQL = text("""
+    SELECT * FROM (
+        SELECT id, session_id, message_type, message, CAST(sources AS TEXT) AS sources_json, created_at
+        FROM chat_history
+        WHERE user_id = :user_id
+          AND (created_at < :before OR (created_at = :before AND id < :before_id))
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit
+    ) AS page
+    ORDER BY created_at, id
+""").bindparams(
+    bindparam('before', type_=DateTime)
+).columns(created_at=DateTime)
+
+_SESSION_HISTORY_SQL = text("""
+    SELECT id, message_type, message, CAST(sources AS TEXT) AS sources_json, created_at
+    FROM chat_history
+    WHERE session_id = :session_id
+    ORDER BY created_at, id
+""").columns(created_at=DateTime)
+
+# Page of a session's history ending `offset` messages before its newest, in chronological order
+_SESSION_HISTORY_PAGE_SQL = text("""
+    SELECT * FROM (
+        SELECT id, message_type, message, CAST(sources AS TEXT) AS sources_json, created_at
+        FROM chat_history
+        WHERE session_id = :session_id
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit OFFSET :offset
+    ) AS page
+    ORDER BY created_at, id
+""").columns(created_at=DateTime)
+
+_USER_SESSIONS_SQL = text("""
+    SELECT 
+        session_id,
+        MIN(created_at) as first_message,
+        MAX(created_at) as last_message,
+        COUNT(*) as message_count
+    FROM chat_history
+    WHERE user_id = :user_id
+    GROUP BY session_id
+    ORDER BY MAX(created_at) DESC
+""")
+
+_USER_STATS_SQL = text("""
+    SELECT COUNT(*), COUNT(DISTINCT session_id)
+    FROM chat_history
+    WHERE user_id = :user_id
+""")
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configure each new SQLite connection for concurrent reads and cheap commits"""
+    cursor = dbapi_connection.cursor()
+    # journal_mode reports the mode actually in effect; in-memory databases stay 'memory'
+    journal_mode = cursor.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    if journal_mode.lower() not in ('wal', 'memory'):
+        logger.warning("SQLite WAL mode unavailable, using journal_mode=%s", journal_mode)
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA journal_size_limit=6144000")  # Truncate the WAL back to ~6 MB after checkpoints
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-20000")  # ~20 MB page cache per connection
+    cursor.close()
+
 
 class DatabaseManager:
     """Manages database operations for users and chat history"""
@@ -56,26 +212,113 @@ class DatabaseManager:
         if database_url.startswith("postgres://"):
             database_url = database_url.replace("postgres://", "postgresql://", 1)
             
-        self.engine = create_engine(database_url, echo=False)
+        if database_url.startswith("sqlite"):
+            # Share pooled connections across Streamlit's script threads
+            self.engine = create_engine(
+                database_url,
+                echo=False,
+                poolclass=QueuePool,
+                pool_size=5,
+                connect_args={"check_same_thread": False}
+            )
+            event.listen(self.engine, "connect", _set_sqlite_pragmas)
+        else:
+            self.engine = create_engine(database_url, echo=False, pool_pre_ping=True)
+        
         Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(bind=self.engine)
+        
+        # create_all skips existing tables, so add any indexes they are missing
+        for index in ChatHistory.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
+        
+        # The composite session index covers session_id lookups, so the old
+        # single-column index only slows inserts
+        with self.engine.begin() as conn:
+            conn.execute(text("DROP INDEX IF EXISTS ix_chat_history_session_id"))
+        
+        self._migrate_legacy_columns()
+        
+        # One reusable session per thread
+        self.SessionLocal = scoped_session(sessionmaker(bind=self.engine))
+        
+        # Chat messages are buffered and written in batches by a background thread,
+        # so saving a turn never waits on a commit
+        self._pending: List[Tuple[Dict[str, Any], int]] = []  # (row, failed write attempts)
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # Held for a whole write, so reads see committed rows
+        self._flush_threshold = 16
+        self._flush_interval = 5.0  # seconds
+        self._max_write_attempts = 3  # Rows still failing after this many flushes are dropped
+        self._flush_requested = threading.Event()
+        threading.Thread(target=self._flush_loop, name="chat-history-writer", daemon=True).start()
+        atexit.register(self.flush)
+        
+        # Per-user write counters, used to invalidate cached stats
+        self._stats_versions: Dict[int, int] = {}
+    
+    def _migrate_legacy_columns(self):
+        """Convert columns stored as text by older schemas"""
+        with self.engine.begin() as conn:
+            if self.engine.dialect.name == 'sqlite':
+                conn.execute(text(
+                    "UPDATE users SET password_hash = CAST(password_hash AS BLOB) "
+                    "WHERE typeof(password_hash) = 'text'"
+                ))
+            elif self.engine.dialect.name == 'postgresql':
+                column_type = conn.execute(text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_name = 'users' AND column_name = 'password_hash'"
+                )).scalar()
+                if column_type != 'bytea':
+                    conn.execute(text(
+                        "ALTER TABLE users ALTER COLUMN password_hash "
+                        "TYPE BYTEA USING convert_to(password_hash, 'UTF8')"
+                    ))
+                
+                # SQLite already stores JSON as text, so only Postgres needs this
+                column_type = conn.execute(text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_name = 'chat_history' AND column_name = 'sources'"
+                )).scalar()
+                if column_type != 'jsonb':
+                    conn.execute(text(
+                        "ALTER TABLE chat_history ALTER COLUMN sources "
+                        "TYPE JSONB USING sources::jsonb"
+                    ))
     
     def get_session(self) -> Session:
         """Get database session"""
         return self.SessionLocal()
     
+    @contextmanager
+    def session_scope(self):
+        """Provide the thread's session, rolling back on error and releasing its connection"""
+        session = self.get_session()
+        try:
+            yield session
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
     def create_user(self, username: str, email: str, password: str) -> Optional[Dict[str, Any]]:
         """Create a new user"""
         session = self.get_session()
         try:
-            # Hash password
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            # Check the unique indexes before paying for a password hash
+            taken = session.query(User.id).filter(
+                (User.username == username) | 
+                (User.email == email)
+            ).first()
+            if taken:
+                return None
             
             # Create user
             user = User(
                 username=username,
                 email=email,
-                password_hash=password_hash.decode('utf-8')
+                password_hash=_hash_password(password.encode('utf-8'))
             )
             
             session.add(user)
@@ -88,6 +331,7 @@ class DatabaseManager:
                 'created_at': user.created_at
             }
         except IntegrityError:
+            # Lost a race with a concurrent signup
             session.rollback()
             return None
         finally:
@@ -95,30 +339,40 @@ class DatabaseManager:
     
     def authenticate_user(self, username_or_email: str, password: str) -> Optional[Dict[str, Any]]:
         """Authenticate a user"""
-        session = self.get_session()
-        try:
-            # Find user by username or email
-            user = session.query(User).filter(
-                (User.username == username_or_email) | 
-                (User.email == username_or_email)
-            ).first()
+        with self.session_scope() as session:
+            # Find user by username or email: one seek per unique index
+            row = session.execute(_LOGIN_SQL, {'login': username_or_email}).first()
             
-            if user and user.is_active:
-                # Check password
-                if bcrypt.checkpw(password.encode('utf-8'), user.password_hash.encode('utf-8')):
-                    # Update last login
-                    user.last_login = datetime.utcnow()
-                    session.commit()
-                    
-                    return {
-                        'id': user.id,
-                        'username': user.username,
-                        'email': user.email,
-                        'last_login': user.last_login
-                    }
+            if row is None:
+                return None
+            
+            user_id, username, email, password_hash, is_active = row
+            if not is_active:
+                return None
+            
+            # Check password
+            password_bytes = password.encode('utf-8')
+            if bcrypt.checkpw(password_bytes, password_hash):
+                last_login = datetime.utcnow()
+                updates = {'last_login': last_login}
+                
+                # Re-hash with the current cost factor if it has changed
+                if _needs_rehash(password_hash):
+                    updates['password_hash'] = _hash_password(password_bytes)
+                
+                # Update last login
+                session.query(User).filter(User.id == user_id).update(
+                    updates, synchronize_session=False
+                )
+                session.commit()
+                
+                return {
+                    'id': user_id,
+                    'username': username,
+                    'email': email,
+                    'last_login': last_login
+                }
             return None
-        finally:
-            session.close()
     
     def save_chat_message(
         self, 
@@ -128,89 +382,210 @@ class DatabaseManager:
         sources: Optional[List[Dict]] = None,
         user_id: Optional[int] = None
     ):
-        """Save a chat message to history"""
-        session = self.get_session()
-        try:
-            chat = ChatHistory(
-                user_id=user_id,
-                session_id=session_id,
-                message_type=message_type,
-                message=message,
-                sources=json.dumps(sources) if sources else None
-            )
-            session.add(chat)
+        """Queue a chat message for the next batched write"""
+        self.save_chat_messages(
+            session_id,
+            [{'message_type': message_type, 'message': message, 'sources': sources}],
+            user_id=user_id
+        )
+    
+    def save_chat_messages(
+        self,
+        session_id: str,
+        messages: List[Dict[str, Any]],
+        user_id: Optional[int] = None
+    ):
+        """
+        Queue several chat messages, such as a user/assistant turn, to be written together
+        
+        Args:
+            session_id: Chat session the messages belong to
+            messages: Dicts with 'message_type', 'message' and optional 'sources',
+                in chronological order
+            user_id: Owner of the messages (None for guests)
+        """
+        rows = [
+            {
+                'user_id': user_id,
+                'session_id': session_id,
+                'message_type': msg['message_type'],
+                'message': msg['message'],
+                'sources': msg.get('sources') or None,
+                'created_at': datetime.utcnow()
+            }
+            for msg in messages
+        ]
+        with self._pending_lock:
+            self._pending.extend((row, 0) for row in rows)
+            if user_id is not None:
+                self._bump_stats_version(user_id)
+            due = len(self._pending) >= self._flush_threshold
+        if due:
+            self._flush_requested.set()
+    
+    def _bump_stats_version(self, user_id: int):
+        """Mark the user's cached stats as stale"""
+        self._stats_versions[user_id] = self._stats_versions.get(user_id, 0) + 1
+    
+    def get_stats_version(self, user_id: int) -> int:
+        """Get a counter that changes whenever the user's chat history changes"""
+        return self._stats_versions.get(user_id, 0)
+    
+    def _flush_loop(self):
+        """Write queued messages once a batch fills up or the flush interval passes"""
+        while True:
+            self._flush_requested.wait(self._flush_interval)
+            self._flush_requested.clear()
+            self.flush()
+    
+    def _insert_rows(self, rows: List[Dict[str, Any]]):
+        """Insert chat history rows in one transaction"""
+        with self.session_scope() as session:
+            session.bulk_insert_mappings(ChatHistory, rows)
             session.commit()
-        finally:
-            session.close()
+    
+    def flush(self):
+        """
+        Write all queued chat messages, in a single transaction when possible
+        
+        Never raises, since reads flush first: a failing batch is retried row by
+        row. A failure counts against a row only when it is the row's fault (a
+        constraint or data error, or other rows in the flush were written), and
+        rows that keep failing are dropped after a few flushes so one bad row
+        can't hold up the rest of the queue. When the database itself is
+        unavailable, rows stay queued without using up attempts.
+        """
+        with self._flush_lock:
+            # Take the batch and release the queue, so new messages aren't held up by the write
+            with self._pending_lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+            
+            try:
+                self._insert_rows([row for row, _ in batch])
+                return
+            except Exception:
+                logger.warning("Batched chat message write failed; retrying row by row", exc_info=True)
+            
+            retry = []
+            unexplained = []  # Failures that may be the database's, not the row's
+            written = False
+            for row, attempts in batch:
+                try:
+                    self._insert_rows([row])
+                    written = True
+                except (IntegrityError, DataError):
+                    self._count_failed_write(row, attempts, retry)
+                except Exception:
+                    unexplained.append((row, attempts))
+            
+            for row, attempts in unexplained:
+                if written:
+                    # Other rows went through, so the database is fine and the row is at fault
+                    self._count_failed_write(row, attempts, retry)
+                else:
+                    retry.append((row, attempts))
+            
+            if retry:
+                # Back at the front, so messages keep their order on the next flush
+                with self._pending_lock:
+                    self._pending[:0] = retry
+    
+    def _count_failed_write(self, row: Dict[str, Any], attempts: int, retry: List[Tuple[Dict[str, Any], int]]):
+        """Queue a row that failed by its own fault for another flush, or drop it once out of attempts"""
+        attempts += 1
+        if attempts < self._max_write_attempts:
+            retry.append((row, attempts))
+        else:
+            logger.error(
+                "Dropping chat message for session %s after %d failed writes",
+                row['session_id'], attempts
+            )
     
     def get_user_chat_history(
         self, 
         user_id: int, 
         limit: int = 100,
-        offset: int = 0
+        before: Optional[datetime] = None,
+        before_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        """Get chat history for a user"""
-        session = self.get_session()
-        try:
-            chats = session.query(ChatHistory).filter(
-                ChatHistory.user_id == user_id
-            ).order_by(
-                ChatHistory.created_at.desc()
-            ).limit(limit).offset(offset).all()
+        """
+        Get chat history for a user
+        
+        Args:
+            user_id: User whose messages to load
+            limit: Maximum number of messages to return
+            before: created_at of the oldest message already shown; only older
+                messages are returned
+            before_id: id of that message, to break ties on created_at
+        """
+        self.flush()
+        with self.session_scope() as session:
+            if before is None:
+                rows = session.execute(_USER_HISTORY_SQL, {
+                    'user_id': user_id, 'limit': limit
+                }).mappings().all()
+            else:
+                rows = session.execute(_USER_HISTORY_BEFORE_SQL, {
+                    'user_id': user_id, 'limit': limit,
+                    'before': before, 'before_id': before_id
+                }).mappings().all()
             
             history = []
-            for chat in reversed(chats):  # Reverse to get chronological order
+            for row in rows:
                 history.append({
-                    'id': chat.id,
-                    'session_id': chat.session_id,
-                    'message_type': chat.message_type,
-                    'message': chat.message,
-                    'sources': json.loads(chat.sources) if chat.sources else None,
-                    'created_at': chat.created_at.isoformat()
+                    'id': row['id'],
+                    'session_id': row['session_id'],
+                    'message_type': row['message_type'],
+                    'message': row['message'],
+                    'sources_json': row['sources_json'],
+                    'created_at': row['created_at'].isoformat()
                 })
             
             return history
-        finally:
-            session.close()
     
-    def get_session_chat_history(self, session_id: str) -> List[Dict[str, Any]]:
-        """Get chat history for a specific session"""
-        session = self.get_session()
-        try:
-            chats = session.query(ChatHistory).filter(
-                ChatHistory.session_id == session_id
-            ).order_by(ChatHistory.created_at).all()
-            
-            history = []
-            for chat in chats:
-                history.append({
-                    'id': chat.id,
-                    'message_type': chat.message_type,
-                    'message': chat.message,
-                    'sources': json.loads(chat.sources) if chat.sources else None,
-                    'created_at': chat.created_at.isoformat()
+    def get_session_chat_history(
+        self,
+        session_id: str,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Get chat history for a specific session
+        
+        Args:
+            session_id: Session whose messages to load
+            limit: Maximum number of messages to return; all of them if None
+            offset: Number of newest messages to skip when limit is given
+        """
+        self.flush()
+        with self.session_scope() as session:
+            if limit is None:
+                rows = session.execute(_SESSION_HISTORY_SQL, {'session_id': session_id})
+            else:
+                rows = session.execute(_SESSION_HISTORY_PAGE_SQL, {
+                    'session_id': session_id, 'limit': limit, 'offset': offset
                 })
             
-            return history
-        finally:
-            session.close()
+            # Plain tuples unpack faster than per-key lookups on mapping rows
+            return [
+                {
+                    'id': id_,
+                    'message_type': message_type,
+                    'message': message,
+                    'sources_json': sources_json,
+                    'created_at': created_at.isoformat()
+                }
+                for id_, message_type, message, sources_json, created_at in rows
+            ]
     
     def get_user_sessions(self, user_id: int) -> List[Dict[str, Any]]:
         """Get all unique sessions for a user"""
-        session = self.get_session()
-        try:
+        self.flush()
+        with self.session_scope() as session:
             # Get unique sessions with their first and last message times
-            result = session.execute("""
-                SELECT 
-                    session_id,
-                    MIN(created_at) as first_message,
-                    MAX(created_at) as last_message,
-                    COUNT(*) as message_count
-                FROM chat_history
-                WHERE user_id = :user_id
-                GROUP BY session_id
-                ORDER BY MAX(created_at) DESC
-            """, {'user_id': user_id})
+            result = session.execute(_USER_SESSIONS_SQL, {'user_id': user_id})
             
             sessions = []
             for row in result:
@@ -222,13 +597,11 @@ class DatabaseManager:
                 })
             
             return sessions
-        finally:
-            session.close()
     
     def delete_session_history(self, session_id: str, user_id: Optional[int] = None):
         """Delete all messages from a session"""
-        session = self.get_session()
-        try:
+        self.flush()
+        with self.session_scope() as session:
             query = session.query(ChatHistory).filter(
                 ChatHistory.session_id == session_id
             )
@@ -239,32 +612,51 @@ class DatabaseManager:
             
             query.delete()
             session.commit()
-        finally:
-            session.close()
+        
+        if user_id:
+            self._bump_stats_version(user_id)
+    
+    def get_cached_response(self, cache_key: str, max_age: float) -> Optional[Dict[str, Any]]:
+        """Get a stored query result, or None if missing or older than max_age seconds"""
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        with self.session_scope() as session:
+            return session.query(QueryCache.result).filter(
+                QueryCache.cache_key == cache_key,
+                QueryCache.created_at > cutoff
+            ).scalar()
+    
+    def save_cached_response(self, cache_key: str, result: Dict[str, Any]):
+        """Store a query result, replacing any older entry for the same key"""
+        with self.session_scope() as session:
+            try:
+                session.merge(QueryCache(cache_key=cache_key, result=result, created_at=datetime.utcnow()))
+                session.commit()
+            except IntegrityError:
+                # Another process stored the same key first; its entry is as good
+                session.rollback()
+    
+    def prune_cached_responses(self, max_age: float):
+        """Delete stored query results older than max_age seconds"""
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        with self.session_scope() as session:
+            session.query(QueryCache).filter(QueryCache.created_at <= cutoff).delete()
+            session.commit()
     
     def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """Get statistics for a user"""
-        session = self.get_session()
-        try:
-            total_messages = session.query(ChatHistory).filter(
-                ChatHistory.user_id == user_id
-            ).count()
-            
-            unique_sessions = session.execute("""
-                SELECT COUNT(DISTINCT session_id)
-                FROM chat_history
-                WHERE user_id = :user_id
-            """, {'user_id': user_id}).scalar()
+        self.flush()
+        with self.session_scope() as session:
+            total_messages, unique_sessions = session.execute(
+                _USER_STATS_SQL, {'user_id': user_id}
+            ).one()
             
             return {
                 'total_messages': total_messages,
                 'unique_sessions': unique_sessions
             }
-        finally:
-            session.close()
 
 # Initialize database manager as a singleton
 @st.cache_resource
 def get_database_manager():
     """Get or create database manager instance"""
-    return DatabaseManager()
\ No newline at end of file
+    return DatabaseManager()
@@ -21,7 +21,8 @@ import time
 from llama_index.core import (
     VectorStoreIndex,
     StorageContext,
-    Settings
+    Settings,
+    QueryBundle
 )
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.retrievers import VectorIndexRetriever
@@ -74,6 +75,8 @@ class SpaceMissionQueryEngine:
         self.top_k = top_k
         self.similarity_threshold = similarity_threshold
         self.temperature = temperature
+        self.embedding_model = embedding_model
+        self.llm_model = llm_model
         
         # Initialize components
         self._setup_openai()
@@ -243,27 +246,12 @@ class SpaceMissionQueryEngine:
         result = {
             'query': query_text,
             'response': str(response),
-            'metadata': {
-                'response_time': time.time() - start_time,
-                'model': Settings.llm.model,
-                'temperature': self.temperature,
-                'top_k': self.top_k,
-                'response_mode': response_mode.value,
-                'timestamp': datetime.now().isoformat(),
-                'source': 'chromadb_cloud' if self.use_cloud else 'chromadb_local'
-            }
+            'metadata': self._build_metadata(start_time, response_mode)
         }
         
         # Add source documents if requested
         if return_sources and hasattr(response, 'source_nodes'):
-            sources = []
-            for node in response.source_nodes:
-                source = {
-                    'text': node.text[:500] + "..." if len(node.text) > 500 else node.text,
-                    'metadata': node.metadata,
-                    'score': node.score
-                }
-                sources.append(source)
+            sources = self._extract_sources(response)
             result['sources'] = sources
             
             if verbose:
@@ -278,6 +266,80 @@ class SpaceMissionQueryEngine:
         
         return result
     
+    def embed_query(self, query_text: str) -> List[float]:
+        """Embed a query with the engine's embedding model"""
+        return Settings.embed_model.get_query_embedding(query_text)
+    
+    def stream_query(
+        self,
+        query_text: str,
+        response_mode: ResponseMode = ResponseMode.COMPACT,
+        metadata_filters: Optional[Dict[str, Any]] = None,
+        return_sources: bool = True,
+        query_embedding: Optional[List[float]] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute a query, streaming the generated answer
+        
+        Retrieval completes before this returns; generation happens as the
+        caller consumes 'response_gen'.
+        
+        Args:
+            query_text: The query string
+            response_mode: How to synthesize the response
+            metadata_filters: Filters to apply to the retrieval
+            return_sources: Whether to return source documents
+            query_embedding: Embedding from embed_query(), so retrieval
+                doesn't embed the query again
+            
+        Returns:
+            Dictionary like query(), with 'response_gen' (an iterator of text
+            chunks) in place of 'response'
+        """
+        start_time = time.time()
+        
+        query_engine = self.create_query_engine(
+            response_mode=response_mode,
+            metadata_filters=metadata_filters,
+            streaming=True
+        )
+        response = query_engine.query(QueryBundle(query_str=query_text, embedding=query_embedding))
+        
+        result = {
+            'query': query_text,
+            'response_gen': response.response_gen,
+            'metadata': self._build_metadata(start_time, response_mode)
+        }
+        
+        if return_sources and hasattr(response, 'source_nodes'):
+            result['sources'] = self._extract_sources(response)
+        
+        return result
+    
+    def _build_metadata(self, start_time: float, response_mode: ResponseMode) -> Dict[str, Any]:
+        """Build the metadata block attached to query results"""
+        return {
+            'response_time': time.time() - start_time,
+            'model': Settings.llm.model,
+            'temperature': self.temperature,
+            'top_k': self.top_k,
+            'response_mode': response_mode.value,
+            'timestamp': datetime.now().isoformat(),
+            'source': 'chromadb_cloud' if self.use_cloud else 'chromadb_local'
+        }
+    
+    def _extract_sources(self, response) -> List[Dict[str, Any]]:
+        """Convert retrieved nodes into plain source dicts"""
+        sources = []
+        for node in response.source_nodes:
+            source = {
+                'text': node.text[:500] + "..." if len(node.text) > 500 else node.text,
+                'metadata': node.metadata,
+                'score': node.score
+            }
+            sources.append(source)
+        return sources
+    
     def batch_query(
         self,
         queries: List[str],
@@ -299,6 +361,18 @@ class SpaceMissionQueryEngine:
             results.append(result)
         return results
     
+    def get_config_key(self) -> str:
+        """Get a string identifying the settings that affect query results"""
+        return "|".join(str(v) for v in (
+            self.collection_name,
+            self.embedding_model,
+            self.llm_model,
+            self.temperature,
+            self.top_k,
+            self.similarity_threshold,
+            self.use_cloud
+        ))
+    
     def get_engine_stats(self) -> Dict[str, Any]:
         """Get statistics about the query engine"""
         collection_stats = self.collection.count()
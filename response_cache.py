@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+In-process cache of query results shared across chatbot sessions,
+optionally backed by the database so entries survive restarts
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of query results with a time-to-live"""
+    
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, store=None):
+        """
+        Initialize the cache
+        
+        Args:
+            max_entries: Maximum number of results to keep in memory
+            ttl: Seconds before a cached result expires
+            store: Optional persistent store with get_cached_response and
+                save_cached_response (a DatabaseManager); consulted on misses
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached result, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+        
+        if self.store is None:
+            return None
+        
+        try:
+            value = self.store.get_cached_response(key, self.ttl)
+        except Exception:
+            # The persistent tier is an optimization; a failing store is just a miss
+            logger.warning("Reading cached response from the store failed", exc_info=True)
+            return None
+        if value is not None:
+            self._remember(key, value)
+        return value
+    
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store a result in memory and, if configured, the persistent store"""
+        self._remember(key, value)
+        if self.store is not None:
+            try:
+                self.store.save_cached_response(key, value)
+            except Exception:
+                logger.warning("Saving cached response to the store failed", exc_info=True)
+    
+    def _remember(self, key: str, value: Dict[str, Any]):
+        """Keep a result in memory, evicting the least recently used entry if full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Remove all cached results"""
+        with self._lock:
+            self._entries.clear()
+
+
+class SemanticCache:
+    """Thread-safe index of answered query embeddings, matched by cosine similarity"""
+    
+    def __init__(self, threshold: float = 0.97, max_entries: int = 256):
+        """
+        Initialize the index
+        
+        Args:
+            threshold: Minimum cosine similarity for two queries to share an answer
+            max_entries: Maximum number of embeddings kept; the oldest go first
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: Optional[np.ndarray] = None  # One unit-length row per key
+        self._keys: List[str] = []
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Scale an embedding to unit length so a dot product is its cosine similarity"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def lookup(self, embedding: List[float]) -> Optional[str]:
+        """Get the response cache key of the most similar answered query, if close enough"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if not self._keys:
+                return None
+            similarities = self._vectors @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                return self._keys[best]
+            return None
+    
+    def add(self, embedding: List[float], key: str):
+        """Record the response cache key answering a query embedding"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = vector[np.newaxis, :]
+            else:
+                self._vectors = np.vstack((self._vectors, vector))
+            self._keys.append(key)
+            
+            if len(self._keys) > self.max_entries:
+                self._vectors = self._vectors[1:]
+                self._keys.pop(0)
@@ -11,19 +11,224 @@ import os
 import json
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+import time
 import hashlib
+import heapq
+import itertools
+import secrets
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 
 import streamlit as st
-from query_pipeline import SpaceMissionQueryEngine
-from llama_index.core.response_synthesizers import ResponseMode
 from database_manager import get_database_manager
-from auth_manager import AuthManager
+from auth_manager import get_auth_manager, run_password_kdf
+from response_cache import ResponseCache, SemanticCache
+
+if TYPE_CHECKING:
+    # query_pipeline pulls in llama_index and chromadb; it is imported at runtime
+    # only by the background engine build so the first page render doesn't wait on it
+    from query_pipeline import SpaceMissionQueryEngine
+
+logger = logging.getLogger(__name__)
+
+# Messages fetched per page of the sidebar history (10 question/answer turns)
+HISTORY_PAGE_SIZE = 20
+
+# Fixed query options, shared by live answers and the example pre-warm so both cache alike;
+# response_mode is left at the engine's default, ResponseMode.COMPACT
+_QUERY_KWARGS = {
+    'return_sources': True
+}
+
+# Logged-in transcripts are cut back to the newest KEEP messages once they pass MAX;
+# older ones stay in the database and load on demand
+TRANSCRIPT_MAX_MESSAGES = 40
+TRANSCRIPT_KEEP_MESSAGES = 20
+
+# Number of newest messages drawn on each run; older ones are drawn on request
+TRANSCRIPT_WINDOW = 30
+
+# Saved sources keep a short excerpt and only the metadata the sources list uses
+STORED_SOURCE_TEXT_CHARS = 300
+_STORED_SOURCE_METADATA = frozenset(('mission_id', 'title', 'url'))
+
+# Sidebar example questions with their button keys, built once at import
+_EXAMPLES = tuple((text, f"example_{i}") for i, text in enumerate([
+    "What orbit regimes have been used for SAR imaging satellites?",
+    "What are typical power requirements for Earth observation CubeSats?",
+    "Which missions have used optical imaging payloads?",
+    "What are common failure modes in small satellite missions?",
+    "Compare antenna designs used in different SAR missions"
+]))
+
+def _find_profile_picture() -> Optional[str]:
+    """Locate the About page picture next to this file, falling back to the working directory"""
+    for path in (Path(__file__).parent / "profile_picture.jpg", Path("profile_picture.jpg")):
+        if path.exists():
+            return str(path)
+    return None
+
+
+# Resolved once at import rather than checked on every About page render
+_PROFILE_PICTURE = _find_profile_picture()
+
+_PAGE_CONFIG = {
+    'page_title': "Space Mission Design Assistant",
+    'page_icon': "🚀",
+    'layout': "wide"
+}
+
+_CHAT_CSS = """
+<style>
+.stChatMessage {
+    padding: 1rem;
+    margin-bottom: 1rem;
+    border-radius: 0.5rem;
+}
+div[data-testid="stHorizontalBlock"] > div:first-child {
+    flex-grow: 0;
+}
+</style>
+"""
+
+
+def _build_query_engine() -> "SpaceMissionQueryEngine":
+    """Construct the query engine with the app's retrieval settings"""
+    from query_pipeline import SpaceMissionQueryEngine
+    
+    return SpaceMissionQueryEngine(
+        use_cloud=True,  # Use ChromaDB cloud
+        top_k=5, # Retrieve top 5 documents
+        similarity_threshold=0.1, # Lower threshold for more results
+        temperature=0.1, # Optimal result
+        llm_model="o3"
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def start_query_engine(api_key_hash: str) -> Future:
+    """
+    Start building the query engine in the background, once per process
+    
+    Args:
+        api_key_hash: Hash of the OpenAI API key, so a rotated key gets a new engine
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="engine-build")
+    future = executor.submit(_build_query_engine)
+    executor.shutdown(wait=False)
+    return future
+
+
+def get_query_engine(api_key_hash: str) -> "SpaceMissionQueryEngine":
+    """Get the engine shared across sessions, waiting for its build if still running"""
+    future = start_query_engine(api_key_hash)
+    if not future.done():
+        with st.spinner("Initializing Space Mission Assistant..."):
+            wait([future])
+    
+    try:
+        return future.result()
+    except Exception:
+        # Forget the failed build so the next run starts a fresh one
+        start_query_engine.clear()
+        raise
+
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """Get the query result cache shared by all sessions, persisted in the app database"""
+    db_manager = get_database_manager()
+    ttl = 86400  # The knowledge base is static, so answers stay valid for a day
+    try:
+        db_manager.prune_cached_responses(ttl)
+    except Exception:
+        # Stale rows are ignored on read anyway
+        logger.warning("Pruning cached responses failed", exc_info=True)
+    return ResponseCache(max_entries=1024, ttl=ttl, store=db_manager)
+
+
+@st.cache_resource
+def get_semantic_cache(config_key: str) -> SemanticCache:
+    """
+    Get the index of answered query embeddings shared by all sessions
+    
+    Args:
+        config_key: Engine settings key; answers from other settings never match
+    """
+    return SemanticCache(threshold=0.97, max_entries=256)
+
+
+# Shared stand-in for sources without metadata; only ever read
+_NO_METADATA: Dict[str, Any] = {}
+
+
+def _normalize_url(url: str) -> str:
+    """Give scheme-less source URLs an https:// prefix so they render as links"""
+    if not url or url.startswith(('http://', 'https://')):
+        return url
+    return f"https://{url}"
+
+
+def _response_cache_key(engine: "SpaceMissionQueryEngine", query: str) -> str:
+    """
+    Key a query's cached answer by engine settings and normalized question text
+    
+    Case and whitespace differences map to the same entry; hashing keeps keys
+    a fixed size however long the question is.
+    """
+    normalized = " ".join(query.split()).lower()
+    digest = hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+    return f"{engine.get_config_key()}|{digest}"
+
+
+def _warm_example_answers(engine: "SpaceMissionQueryEngine", cache: ResponseCache):
+    """Answer each sidebar example question into the cache; runs off the script thread"""
+    for example, _ in _EXAMPLES:
+        key = _response_cache_key(engine, example)
+        if cache.get(key) is not None:
+            continue
+        try:
+            result = engine.query(example, **_QUERY_KWARGS)
+        except Exception:
+            # Best effort: the examples are simply answered live instead
+            return
+        result['sources'] = StreamlitSpaceMissionChatbot._dedupe_sources(result.get('sources') or [], engine.top_k)
+        cache.set(key, result)
+
+
+@st.cache_resource(show_spinner=False)
+def prewarm_example_answers(api_key_hash: str) -> threading.Thread:
+    """Start warming the example question answers, once per engine"""
+    thread = threading.Thread(
+        target=_warm_example_answers,
+        args=(start_query_engine(api_key_hash).result(), get_response_cache()),
+        name="example-prewarm",
+        daemon=True
+    )
+    thread.start()
+    return thread
 
 
 class StreamlitSpaceMissionChatbot:
     """Streamlit-based chatbot for space mission queries"""
     
+    # Immutable per-session defaults; mutable and generated values are set in __init__
+    _SESSION_DEFAULTS = {
+        'initialized': False,
+        'show_sources': True,
+        'query_count': 0,
+        'authenticated': False,
+        'current_user': None,
+        'show_login': False,
+        'show_login_modal': False,
+        'show_signup_modal': False,
+        'current_page': "chat",
+        'has_earlier_messages': False,
+        'transcript_window': TRANSCRIPT_WINDOW
+    }
+    
     def __init__(self, log_dir: str = "./chat_logs"):
         """
         Initialize the Streamlit chatbot interface
@@ -33,116 +238,188 @@ class StreamlitSpaceMissionChatbot:
         """
         self.log_dir = Path(log_dir)
         self.db_manager = get_database_manager()
-        self.auth_manager = AuthManager()
+        self.auth_manager = get_auth_manager()
+        self.query_engine = None
+        self.user_id = None  # Logged in user's id, read once per run in run()
         
         # Create log directory if it doesn't exist
         self.log_dir.mkdir(exist_ok=True)
         
-        # Initialize session state
-        if 'initialized' not in st.session_state:
-            st.session_state.initialized = False
-            st.session_state.messages = []
+        # Initialize session state; setdefault also fills keys missing from a partial restore
+        for key, value in self._SESSION_DEFAULTS.items():
+            st.session_state.setdefault(key, value)
+        st.session_state.setdefault('messages', [])
+        if 'session_id' not in st.session_state:
             st.session_state.session_id = self._generate_session_id()
             st.session_state.session_start = datetime.now()
-            st.session_state.show_sources = True
-            st.session_state.query_count = 0
-            st.session_state.query_engine = None
-            st.session_state.authenticated = False
-            st.session_state.current_user = None
-            st.session_state.show_login = False
-            st.session_state.show_login_modal = False
-            st.session_state.show_signup_modal = False
-            st.session_state.current_page = "chat"
     
     def _generate_session_id(self) -> str:
         """Generate a unique session ID"""
-        timestamp = datetime.now().isoformat()
-        return hashlib.md5(timestamp.encode()).hexdigest()[:8]
-    
-    def _save_message_to_db(self, role: str, content: str, sources: List[Dict] = None):
-        """Save a single message to database for logged in users"""
-        if st.session_state.current_user:
-            self.db_manager.save_chat_message(
-                session_id=st.session_state.session_id,
-                message_type=role,
-                message=content,
-                sources=sources,
-                user_id=st.session_state.current_user['id']
-            )
+        return secrets.token_hex(16)
     
-    def _load_user_history(self):
-        """Load chat history for logged in users"""
-        if st.session_state.current_user and len(st.session_state.messages) == 0:
-            # Load recent messages from current session
-            history = self.db_manager.get_session_chat_history(st.session_state.session_id)
-            for msg in history:
-                st.session_state.messages.append({
-                    "role": msg["message_type"],
-                    "content": msg["message"],
-                    "timestamp": msg["created_at"],
-                    "sources": msg.get("sources", [])
-                })
+    def _save_turn_to_db(self, query: str, response: str, sources: List[Dict] = None) -> bool:
+        """Save a user/assistant exchange, with compacted sources, in one write for logged in users"""
+        if self.user_id is None:
+            return False
+        
+        self.db_manager.save_chat_messages(
+            session_id=st.session_state.session_id,
+            messages=[
+                {'message_type': 'user', 'message': query},
+                {'message_type': 'assistant', 'message': response, 'sources': sources}
+            ],
+            user_id=self.user_id
+        )
+        return True
     
-    def _format_sources(self, sources: List[Dict]) -> str:
-        """Format source documents for display with deduplication"""
+    def _compact_sources(self, sources: Optional[List[Dict]]) -> Optional[List[Dict]]:
+        """Keep only what the sources list displays, so stored rows and messages stay small"""
         if not sources:
-            return ""
+            return sources
+        return [
+            {
+                'text': source.get('text', '')[:STORED_SOURCE_TEXT_CHARS],
+                'metadata': {k: v for k, v in source.get('metadata', {}).items() if k in _STORED_SOURCE_METADATA},
+                'score': source.get('score', 0)
+            }
+            for source in sources
+        ]
+    
+    def _load_user_history(self):
+        """Load chat history for logged in users, once per user per session"""
+        if st.session_state.get('history_loaded_for') == self.user_id:
+            return
+        
+        if self.user_id is not None and len(st.session_state.messages) == 0:
+            # Only attempt once: an empty result or a cleared chat must not query again
+            st.session_state.history_loaded_for = self.user_id
             
-        # Deduplicate sources based on mission_id
-        seen_missions = {}
-        unique_sources = []
+            # Load the most recent messages from current session; older ones load on demand
+            history = self.db_manager.get_session_chat_history(
+                st.session_state.session_id,
+                limit=TRANSCRIPT_KEEP_MESSAGES
+            )
+            st.session_state.messages = self._history_to_messages(history)
+            st.session_state.has_earlier_messages = len(history) == TRANSCRIPT_KEEP_MESSAGES
+    
+    def _history_to_messages(self, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convert stored chat rows into transcript messages"""
+        return [
+            {
+                "role": msg["message_type"],
+                "content": msg["message"],
+                "timestamp": msg["created_at"],
+                # Sources are already part of the stored answer text, so the raw
+                # sources_json column is left unparsed
+                "persisted": True
+            }
+            for msg in history
+        ]
+    
+    def _trim_messages(self):
+        """Drop the oldest saved messages once the transcript grows past its cap"""
+        messages = st.session_state.messages
+        if len(messages) <= TRANSCRIPT_MAX_MESSAGES:
+            return
+        
+        # Only saved messages can be fetched back, so stop at the first unsaved one
+        drop = 0
+        while drop < len(messages) - TRANSCRIPT_KEEP_MESSAGES and messages[drop].get("persisted"):
+            drop += 1
+        if drop:
+            st.session_state.messages = messages[drop:]
+            st.session_state.has_earlier_messages = True
+            st.session_state.transcript_window = TRANSCRIPT_WINDOW
+    
+    def _load_earlier_messages(self):
+        """Prepend the page of stored messages just before the oldest one shown"""
+        shown = sum(1 for m in st.session_state.messages if m.get("persisted"))
+        history = self.db_manager.get_session_chat_history(
+            st.session_state.session_id,
+            limit=HISTORY_PAGE_SIZE,
+            offset=shown
+        )
+        st.session_state.messages = self._history_to_messages(history) + st.session_state.messages
+        st.session_state.has_earlier_messages = len(history) == HISTORY_PAGE_SIZE
+        # Widen the drawn window so the requested page actually shows
+        st.session_state.transcript_window += len(history)
+    
+    @staticmethod
+    def _dedupe_sources(sources: List[Dict], limit: int) -> List[Dict]:
+        """
+        Keep the best-scoring source per mission, sorted by score descending
+        
+        Args:
+            sources: Retrieved sources, possibly several per mission
+            limit: Maximum number of sources to keep
+        """
+        # Deduplicate sources based on mission_id in one pass
+        best: Dict[str, Dict] = {}
+        no_id: List[Dict] = []
         
         for source in sources:
-            metadata = source.get('metadata', {})
-            mission_id = metadata.get('mission_id', '')
-            
+            mission_id = source.get('metadata', {}).get('mission_id', '')
             if mission_id:
-                if mission_id not in seen_missions:
-                    seen_missions[mission_id] = source
-                    unique_sources.append(source)
-                elif source.get('score', 0) > seen_missions[mission_id].get('score', 0):
-                    idx = unique_sources.index(seen_missions[mission_id])
-                    unique_sources[idx] = source
-                    seen_missions[mission_id] = source
+                current = best.get(mission_id)
+                if current is None or source.get('score', 0) > current.get('score', 0):
+                    best[mission_id] = source
             else:
-                unique_sources.append(source)
-            
-            if len(unique_sources) >= 20:
-                break
+                no_id.append(source)
         
-        # Sort by score descending
-        unique_sources.sort(key=lambda x: x.get('score', 0), reverse=True)
+        # Select the top `limit` by score without sorting everything, before anything is formatted
+        return heapq.nlargest(
+            limit,
+            itertools.chain(best.values(), no_id),
+            key=lambda x: x.get('score', 0)
+        )
+    
+    def _format_sources(self, sources: List[Dict]) -> str:
+        """Format already deduplicated source documents for display"""
+        if not sources:
+            return ""
         
-        formatted = "\n\n**Sources:**"
-        for i, source in enumerate(unique_sources, 1):
-            metadata = source.get('metadata', {})
-            title = metadata.get('title', 'Unknown Mission')
-            url = metadata.get('url', '')
+        lines = ["\n\n**Sources:**"]
+        for i, source in enumerate(sources, 1):
+            metadata = source.get('metadata') or _NO_METADATA
+            title = (metadata.get('title') or 'Unknown Mission').removesuffix(' - eoPortal')
+            url = _normalize_url(metadata.get('url', ''))
             score = source.get('score', 0)
             
-            # Clean up title if needed
-            if title and ' - eoPortal' in title:
-                title = title.replace(' - eoPortal', '')
-            
             # Format with URL if available
             if url:
-                if not url.startswith('http'):
-                    url = f"https://{url}"
-                formatted += f"\n{i}. [{title}]({url}) (relevance: {score:.3f})"
+                lines.append(f"{i}. [{title}]({url}) (relevance: {score:.3f})")
             else:
-                formatted += f"\n{i}. **{title}** (relevance: {score:.3f})"
+                lines.append(f"{i}. **{title}** (relevance: {score:.3f})")
         
-        return formatted
+        return "\n".join(lines)
+    
+    def _cache_key(self, query: str) -> str:
+        """Build the response cache key for a query under the current engine settings"""
+        return _response_cache_key(self.query_engine, query)
     
     def _process_query(self, query: str) -> Dict[str, Any]:
-        """Process a user query and return the result"""
+        """
+        Process a user query and return the result
+        
+        Cached answers are returned complete; fresh ones carry a 'response_gen'
+        stream that _render_response consumes.
+        """
         try:
-            result = st.session_state.query_engine.query(
-                query,
-                response_mode=ResponseMode.COMPACT,
-                return_sources=True,
-                verbose=False
-            )
+            cache = get_response_cache()
+            key = self._cache_key(query)
+            result = cache.get(key)
+            if result is None:
+                # Paraphrases of an answered question reuse its answer; the embedding
+                # is passed on so retrieval doesn't embed the query a second time
+                embedding = self.query_engine.embed_query(query)
+                semantic_cache = get_semantic_cache(self.query_engine.get_config_key())
+                similar_key = semantic_cache.lookup(embedding)
+                if similar_key is not None:
+                    result = cache.get(similar_key)
+                if result is None:
+                    result = self.query_engine.stream_query(query, query_embedding=embedding, **_QUERY_KWARGS)
+                    # Indexed by _render_response once the answer is cached
+                    result['query_embedding'] = embedding
             
             # Increment query count
             st.session_state.query_count += 1
@@ -156,6 +433,31 @@ class StreamlitSpaceMissionChatbot:
                 'metadata': {'response_time': 0}
             }
     
+    def _render_response(self, query: str, result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """Display the answer, streaming it if needed, and return the completed result"""
+        if 'response_gen' not in result:
+            st.write(result['response'])
+            return {**result, 'metadata': {**result['metadata'], 'response_time': time.time() - start_time}}
+        
+        try:
+            response = st.write_stream(result['response_gen'])
+        except Exception as e:
+            error = f"Error processing query: {str(e)}"
+            st.write(error)
+            return {'response': error, 'sources': [], 'metadata': {'response_time': 0}}
+        
+        completed = {
+            'query': query,
+            'response': response,
+            'sources': self._dedupe_sources(result.get('sources') or [], self.query_engine.top_k),
+            'metadata': {**result['metadata'], 'response_time': time.time() - start_time}
+        }
+        key = self._cache_key(query)
+        get_response_cache().set(key, completed)
+        # Only index answers that exist, so paraphrases never match a failed stream
+        get_semantic_cache(self.query_engine.get_config_key()).add(result['query_embedding'], key)
+        return completed
+    
     def render_header(self):
         """Render header with navigation and auth buttons"""
         col1, col2, col3 = st.columns([6, 1, 1])
@@ -186,6 +488,11 @@ class StreamlitSpaceMissionChatbot:
                     st.session_state.authenticated = False
                     st.session_state.current_user = None
                     st.session_state.messages = []
+                    st.session_state.has_earlier_messages = False
+                    st.session_state.transcript_window = TRANSCRIPT_WINDOW
+                    st.session_state.pop('user_history', None)
+                    # Logging back in must restore the stored transcript
+                    st.session_state.pop('history_loaded_for', None)
                     st.rerun()
             else:
                 if st.button("Sign Up", use_container_width=True):
@@ -207,8 +514,11 @@ class StreamlitSpaceMissionChatbot:
                     cancel_button = st.form_submit_button("Cancel", use_container_width=True)
                 
                 if login_button:
-                    user = self.db_manager.authenticate_user(username, password)
-                    if user:
+                    user = run_password_kdf("Signing in...", self.db_manager.authenticate_user,
+                                            username, password)
+                    if user is False:
+                        st.error("Login is taking longer than usual. Please try again.")
+                    elif user:
                         st.session_state.current_user = user
                         st.session_state.authenticated = True
                         st.session_state.show_login_modal = False
@@ -246,8 +556,11 @@ class StreamlitSpaceMissionChatbot:
                     elif len(new_password) < 6:
                         st.error("Password must be at least 6 characters")
                     else:
-                        user = self.db_manager.create_user(new_username, new_email, new_password)
-                        if user:
+                        user = run_password_kdf("Creating account...", self.db_manager.create_user,
+                                                new_username, new_email, new_password)
+                        if user is False:
+                            st.error("Sign-up is taking longer than usual. Please try again.")
+                        elif user:
                             st.session_state.current_user = user
                             st.session_state.authenticated = True
                             st.session_state.show_signup_modal = False
@@ -271,15 +584,10 @@ class StreamlitSpaceMissionChatbot:
         
         with col1:
             # Profile picture placeholder
-            profile_path = Path(__file__).parent / "profile_picture.jpg"
-            if profile_path.exists():
-                st.image(str(profile_path), width=200)
+            if _PROFILE_PICTURE:
+                st.image(_PROFILE_PICTURE, width=200)
             else:
-                # Try current directory as fallback
-                if os.path.exists("profile_picture.jpg"):
-                    st.image("profile_picture.jpg", width=200)
-                else:
-                    st.info("📷 Add profile_picture.jpg to the project directory")
+                st.info("📷 Add profile_picture.jpg to the project directory")
         
         with col2:
             st.markdown("""
@@ -315,92 +623,136 @@ class StreamlitSpaceMissionChatbot:
     
     def render_sidebar(self):
         """Render the sidebar with settings and information"""
+        # Fragments can't reach st.sidebar themselves, so the panel is called inside it
         with st.sidebar:
-            st.header("Space Mission Chatbot")
-            
-            # User info
-            if st.session_state.current_user:
-                st.subheader("Session Info")
-                st.text(f"User: {st.session_state.current_user['username']}")
-                st.text(f"Session ID: {st.session_state.session_id}")
-                st.text(f"Queries: {st.session_state.query_count}")
-            else:
-                st.subheader("Session Info")
-                st.text("Guest User")
-                st.text(f"Session ID: {st.session_state.session_id}")
-                st.text(f"Queries: {st.session_state.query_count}")
-            
-            # Settings
-            st.subheader("Settings")
-            st.session_state.show_sources = st.checkbox(
-                "Show source documents",
-                value=st.session_state.show_sources
-            )
-            
-            # Actions
-            st.subheader("Actions")
-            
-            if st.button("Clear Chat"):
-                st.session_state.messages = []
-                st.session_state.query_count = 0
-                st.rerun()
-            
-            if st.session_state.current_user:
-                if st.button("View History"):
-                    history = self.db_manager.get_user_chat_history(
-                        st.session_state.current_user['id'], 
-                        limit=50
-                    )
-                    if history:
-                        st.subheader("Recent Queries")
-                        for msg in history[:10]:
-                            if msg['message_type'] == 'user':
-                                st.text(f"Q: {msg['message'][:50]}...")
-                    else:
-                        st.info("No history yet")
-            
-            # Examples
-            st.subheader("Example Questions")
-            examples = [
-                "What orbit regimes have been used for SAR imaging satellites?",
-                "What are typical power requirements for Earth observation CubeSats?",
-                "Which missions have used optical imaging payloads?",
-                "What are common failure modes in small satellite missions?",
-                "Compare antenna designs used in different SAR missions"
-            ]
-            
-            for example in examples:
-                if st.button(example, key=f"example_{hash(example)}"):
-                    st.session_state.example_query = example
-                    st.rerun()
-            
-            # Stats
-            if st.checkbox("Show Engine Stats"):
-                if st.session_state.query_engine:
-                    stats = st.session_state.query_engine.get_engine_stats()
-                    st.json(stats)
+            self._render_sidebar_panel()
     
-    def render_chat_interface(self):
-        """Render the main chat interface"""
-        # Load user history if logged in and messages are empty
-        if st.session_state.current_user and len(st.session_state.messages) == 0:
-            self._load_user_history()
+    @st.fragment
+    def _render_sidebar_panel(self):
+        """
+        Render the sidebar contents
         
-        # Display chat messages
-        for message in st.session_state.messages:
+        Runs as a fragment, so settings, history and stats widgets rerun only the
+        sidebar. Clear Chat and the example questions change the chat, so they
+        rerun the whole app.
+        """
+        st.header("Space Mission Chatbot")
+        
+        # User info
+        if st.session_state.current_user:
+            st.subheader("Session Info")
+            st.text(f"User: {st.session_state.current_user['username']}")
+            st.text(f"Session ID: {st.session_state.session_id}")
+            st.text(f"Queries: {st.session_state.query_count}")
+        else:
+            st.subheader("Session Info")
+            st.text("Guest User")
+            st.text(f"Session ID: {st.session_state.session_id}")
+            st.text(f"Queries: {st.session_state.query_count}")
+        
+        # Settings
+        st.subheader("Settings")
+        st.session_state.show_sources = st.checkbox(
+            "Show source documents",
+            value=st.session_state.show_sources
+        )
+        
+        # Actions
+        st.subheader("Actions")
+        
+        if st.button("Clear Chat"):
+            st.session_state.messages = []
+            st.session_state.has_earlier_messages = False
+            st.session_state.transcript_window = TRANSCRIPT_WINDOW
+            st.session_state.query_count = 0
+            st.rerun()
+        
+        if self.user_id is not None:
+            if st.button("View History"):
+                st.session_state.user_history = self.db_manager.get_user_chat_history(
+                    self.user_id,
+                    limit=HISTORY_PAGE_SIZE
+                )
+                st.session_state.user_history_more = (
+                    len(st.session_state.user_history) == HISTORY_PAGE_SIZE
+                )
+
+            if 'user_history' in st.session_state:
+                history = st.session_state.user_history
+                if history:
+                    st.subheader("Recent Queries")
+                    for msg in reversed(history):
+                        if msg['message_type'] == 'user':
+                            st.text(f"Q: {msg['message'][:50]}...")
+
+                    # Keyset pagination: fetch the page older than the oldest row shown
+                    if st.session_state.user_history_more and st.button("Load older"):
+                        oldest = history[0]
+                        older = self.db_manager.get_user_chat_history(
+                            self.user_id,
+                            limit=HISTORY_PAGE_SIZE,
+                            before=datetime.fromisoformat(oldest['created_at']),
+                            before_id=oldest['id']
+                        )
+                        st.session_state.user_history = older + history
+                        st.session_state.user_history_more = len(older) == HISTORY_PAGE_SIZE
+                        st.rerun(scope="fragment")
+                else:
+                    st.info("No history yet")
+        
+        # Examples
+        st.subheader("Example Questions")
+        for example, key in _EXAMPLES:
+            if st.button(example, key=key):
+                st.session_state.example_query = example
+                st.rerun()
+        
+        # Stats
+        if st.checkbox("Show Engine Stats"):
+            if self.query_engine:
+                stats = self.query_engine.get_engine_stats()
+                st.json(stats)
+
+    def _render_messages(self, messages: List[Dict[str, Any]]):
+        """Render the newest stored chat messages as native chat bubbles"""
+        # Older messages are only emitted on request, keeping each rerun's output bounded
+        # The window grows with each page loaded from history; the label stays fixed
+        # since a changing label would make Streamlit reset the toggle
+        older = len(messages) - st.session_state.transcript_window
+        if older > 0:
+            if not st.toggle("Show earlier messages", key="show_earlier_messages"):
+                messages = messages[older:]
+        
+        for message in messages:
             with st.chat_message(message["role"]):
-                st.write(message["content"])
+                # Content is always markdown text; skip st.write's type dispatch
+                st.markdown(message["content"])
                 
                 # Show metadata if available
                 if "metadata" in message and message["role"] == "assistant":
                     st.caption(f"Response time: {message['metadata']['response_time']:.2f}s")
+    
+    @st.fragment
+    def render_chat_interface(self):
+        """
+        Render the main chat interface
         
-        # Handle example query if set
-        if hasattr(st.session_state, 'example_query'):
-            query = st.session_state.example_query
-            del st.session_state.example_query
-        else:
-            # Chat input
+        Runs as a fragment, so sending a message reruns only the chat panel
+        and skips the header, sidebar and auth rendering.
+        """
+        # Load user history if logged in and messages are empty
+        if self.user_id is not None and len(st.session_state.messages) == 0:
+            self._load_user_history()
+        
+        if st.session_state.has_earlier_messages and st.button("Load earlier messages"):
+            self._load_earlier_messages()
+        
+        # Display chat messages
+        self._render_messages(st.session_state.messages)
+        
+        # Handle example query if set, otherwise read the chat input
+        query = st.session_state.pop('example_query', None)
+        if query is None:
             query = st.chat_input(
                 "Ask about space missions, orbits, payloads, etc..."
             )
@@ -413,28 +765,28 @@ class StreamlitSpaceMissionChatbot:
                 "timestamp": datetime.now().isoformat()
             })
             
-            # Save user message to DB if logged in
-            self._save_message_to_db("user", query)
-            
             # Display user message
             with st.chat_message("user"):
                 st.write(query)
             
             # Process query with loading indicator
             with st.chat_message("assistant"):
+                start_time = time.time()
                 with st.spinner("Searching knowledge base..."):
                     result = self._process_query(query)
                 
-                # Display response
+                # Display response as it is generated
+                result = self._render_response(query, result, start_time)
                 response_text = result['response']
                 
                 # Add sources if enabled
                 sources_data = []
                 if st.session_state.show_sources and result.get('sources'):
-                    response_text += self._format_sources(result['sources'])
-                    sources_data = result['sources']
-                
-                st.write(response_text)
+                    sources_text = self._format_sources(result['sources'])
+                    st.write(sources_text)
+                    response_text += sources_text
+                    # Only the compact form is saved; the message itself keeps just the text
+                    sources_data = self._compact_sources(result['sources'])
                 
                 # Show metadata
                 query_time = result['metadata'].get('response_time', 0)
@@ -445,61 +797,42 @@ class StreamlitSpaceMissionChatbot:
                     "role": "assistant",
                     "content": response_text,
                     "timestamp": datetime.now().isoformat(),
-                    "metadata": result['metadata'],
-                    "sources": sources_data
+                    "metadata": result['metadata']
                 })
                 
-                # Save assistant message to DB if logged in
-                self._save_message_to_db("assistant", response_text, sources_data)
+                # Save the whole exchange to DB if logged in
+                if self._save_turn_to_db(query, response_text, sources_data):
+                    for message in st.session_state.messages[-2:]:
+                        message["persisted"] = True
+                    self._trim_messages()
     
     def run(self):
         """Run the Streamlit application"""
-        st.set_page_config(
-            page_title="Space Mission Design Assistant",
-            page_icon="🚀",
-            layout="wide"
-        )
+        st.set_page_config(**_PAGE_CONFIG)
         
-        # Apply custom CSS for better styling
-        st.markdown("""
-        <style>
-        .stChatMessage {
-            padding: 1rem;
-            margin-bottom: 1rem;
-            border-radius: 0.5rem;
-        }
-        div[data-testid="stHorizontalBlock"] > div:first-child {
-            flex-grow: 0;
-        }
-        </style>
-        """, unsafe_allow_html=True)
+        # Apply custom CSS; re-emitted each run since Streamlit drops elements a rerun doesn't draw
+        st.markdown(_CHAT_CSS, unsafe_allow_html=True)
+        
+        # Look the user up once; login and logout both trigger a full rerun
+        self.user_id = st.session_state.current_user['id'] if st.session_state.current_user else None
+        
+        # Get API key from secrets
+        api_key = st.secrets.get("OPENAI_API_KEY")
+        if not api_key:
+            st.error("OpenAI API key not found in Streamlit secrets!")
+            st.info("Please add OPENAI_API_KEY to your Streamlit secrets.")
+            st.stop()
+        
+        # Set the API key in environment
+        os.environ["OPENAI_API_KEY"] = api_key
+        
+        # Shared engine, built in the background so the page renders while it loads
+        api_key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+        start_query_engine(api_key_hash)
         
-        # Initialize query engine if not already done
         if not st.session_state.initialized:
-            try:
-                # Get API key from secrets
-                api_key = st.secrets.get("OPENAI_API_KEY")
-                if not api_key:
-                    st.error("OpenAI API key not found in Streamlit secrets!")
-                    st.info("Please add OPENAI_API_KEY to your Streamlit secrets.")
-                    st.stop()
-                
-                # Set the API key in environment
-                os.environ["OPENAI_API_KEY"] = api_key
-                
-                with st.spinner("Initializing Space Mission Assistant..."):
-                    st.session_state.query_engine = SpaceMissionQueryEngine(
-                        use_cloud=True,  # Use ChromaDB cloud
-                        top_k=5, # Retrieve top 5 documents
-                        similarity_threshold=0.1, # Lower threshold for more results
-                        temperature=0.1, # Optimal result
-                        llm_model="o3"
-                    )
-                    st.session_state.initialized = True
-                    st.session_state.authenticated = True  # Allow immediate access
-            except Exception as e:
-                st.error(f"Error initializing query engine: {e}")
-                st.stop()
+            st.session_state.initialized = True
+            st.session_state.authenticated = True  # Allow immediate access
         
         # Render header with navigation
         self.render_header()
@@ -512,13 +845,21 @@ class StreamlitSpaceMissionChatbot:
         if st.session_state.current_page == "about":
             self.render_about_page()
         else:
-            # Render sidebar
-            self.render_sidebar()
-            
             # Main content area
             st.title("🚀 Space Mission Design Assistant")
             st.markdown("Ask questions about historical space missions, orbits, payloads, and mission designs.")
             
+            # The chat needs the engine, so wait for it here if it is still building
+            try:
+                self.query_engine = get_query_engine(api_key_hash)
+                prewarm_example_answers(api_key_hash)
+            except Exception as e:
+                st.error(f"Error initializing query engine: {e}")
+                st.stop()
+            
+            # Render sidebar
+            self.render_sidebar()
+            
             # Render chat interface
             self.render_chat_interface()
 